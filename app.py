@@ -1,15 +1,28 @@
 import os
-import glob
+from functools import partial
 import streamlit as st
 import numpy as np
-from PIL import Image
 from dotenv import load_dotenv
 from script import (
     OpenAI,
+    create_client,
+    EMBEDDING_DTYPE,
     l2_normalize,
+    search_top_k,
+    load_ann_index,
+    embed_query,
+    embed_in_batches,
+    list_images,
     get_cache_path,
+    get_embeddings_path,
+    load_cache,
+    load_descriptions,
+    save_cache,
+    clear_cache,
+    clear_descriptions_cache,
     build_image_index,
-    describe_image
+    get_hash_cache_path,
+    describe_images_cached
 )
 from unsplash_search import search_and_download
 
@@ -22,30 +35,42 @@ st.set_page_config(
     layout="wide"
 )
 
-def search_images(client: OpenAI, img_emb: np.ndarray, image_paths: list[str], 
-                  descriptions: list[str], query: str, top_k: int = 3):
-    """Busca as top K imagens mais relacionadas ao texto."""
-    # Gera embedding da query
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=[query]
-    )
+@st.cache_resource(max_entries=256)
+def get_query_embedding(_client, query: str) -> np.ndarray:
+    """
+    Gera embedding normalizado da query (cached).
     
-    txt_emb = np.array(response.data[0].embedding)
-    txt_emb = l2_normalize(txt_emb.reshape(1, -1))[0]
+    Com cache_resource, buscas repetidas recebem o mesmo buffer float32,
+    sem desserializar uma cópia a cada rerun; por isso ele é somente leitura.
+    """
+    txt_emb = embed_query(_client, query)
+    txt_emb.setflags(write=False)
+    return txt_emb
+
+def search_images(client: OpenAI, img_emb: np.ndarray, image_paths: list[str], 
+                  get_descriptions, query: str, top_k: int = 3, ann_index=None):
+    """
+    Busca as top K imagens mais relacionadas ao texto.
     
-    # Calcula similaridade
-    scores = img_emb @ txt_emb
+    `get_descriptions(paths)` devolve as descrições das imagens pedidas; só é
+    chamado para os K resultados, depois do ranking. Com `ann_index` (FAISS)
+    a busca é aproximada; sem ele, exata.
+    """
+    # Gera embedding da query (reaproveitado entre reruns)
+    txt_emb = get_query_embedding(client, query)
     
     # Top K resultados
-    top_indices = np.argsort(scores)[::-1][:top_k]
+    top_indices, top_scores = search_top_k(img_emb, txt_emb, top_k, ann_index)
+    
+    top_paths = [image_paths[idx] for idx in top_indices]
+    descriptions = get_descriptions(top_paths)
     
     results = []
-    for idx in top_indices:
+    for path, score, description in zip(top_paths, top_scores, descriptions):
         results.append({
-            'path': image_paths[idx],
-            'score': float(scores[idx]),
-            'description': descriptions[idx]
+            'path': path,
+            'score': float(score),
+            'description': description
         })
     
     return results
@@ -57,16 +82,18 @@ def load_client():
     if not api_key:
         st.error("❌ OPENAI_API_KEY não configurada!")
         st.stop()
-    return OpenAI(api_key=api_key)
+    return create_client(api_key)
 
-@st.cache_data
+@st.cache_resource
 def load_image_data(_client, images_dir: str):
-    """Carrega embeddings das imagens (cached)."""
-    exts = ("*.jpg", "*.jpeg", "*.png", "*.webp", "*.bmp")
-    image_paths = []
-    for e in exts:
-        image_paths.extend(glob.glob(os.path.join(images_dir, e)))
-    image_paths = sorted(image_paths)
+    """
+    Carrega embeddings das imagens (cached).
+    
+    Usa cache_resource para devolver o mesmo array memory-mapped a cada
+    rerun, sem copiá-lo nem serializá-lo. As descrições ficam no disco e
+    são lidas com load_descriptions.
+    """
+    image_paths = list_images(images_dir)
     
     if not image_paths:
         st.error("❌ Nenhuma imagem encontrada na pasta!")
@@ -75,16 +102,13 @@ def load_image_data(_client, images_dir: str):
     cache_path = get_cache_path(images_dir)
     
     # Verifica se tem cache
-    import pickle
-    if os.path.exists(cache_path):
-        try:
-            with open(cache_path, "rb") as f:
-                cached_data = pickle.load(f)
-                if cached_data["paths"] == image_paths:
-                    st.success(f"⚡ Cache carregado! {len(image_paths)} imagens prontas.")
-                    return cached_data["embeddings"], image_paths, cached_data["descriptions"]
-        except:
-            pass
+    try:
+        embeddings = load_cache(cache_path, image_paths)
+        if embeddings is not None:
+            st.success(f"⚡ Cache carregado! {len(image_paths)} imagens prontas.")
+            return embeddings, image_paths, load_ann_index(cache_path, embeddings)
+    except Exception:
+        pass
     
     # Processa do zero com feedback visual
     st.warning(f"🔄 Processando {len(image_paths)} imagens pela primeira vez...")
@@ -92,39 +116,28 @@ def load_image_data(_client, images_dir: str):
     progress_bar = st.progress(0)
     status_text = st.empty()
     
-    # Gera descrições
-    descriptions = []
-    for i, path in enumerate(image_paths):
-        status_text.text(f"📸 Analisando imagem {i+1}/{len(image_paths)}: {os.path.basename(path)}")
-        progress_bar.progress((i) / (len(image_paths) * 2))  # Metade do progresso
-        
-        from script import describe_image
-        desc = describe_image(_client, path)
-        descriptions.append(desc)
+    # Gera descrições (chamadas concorrentes ao GPT-4 Vision)
+    def on_progress(done, total, path):
+        status_text.text(f"📸 Analisando imagem {done}/{total}: {os.path.basename(path)}")
+        progress_bar.progress(done / (total * 2))  # Metade do progresso
+    
+    descriptions = describe_images_cached(
+        _client, image_paths, get_hash_cache_path(images_dir), on_progress=on_progress
+    )
     
     # Gera embeddings
     status_text.text("🔢 Gerando embeddings...")
     progress_bar.progress(0.5)
     
-    response = _client.embeddings.create(
-        model="text-embedding-3-small",
-        input=descriptions
-    )
-    
-    embeddings = np.array([item.embedding for item in response.data])
-    embeddings = l2_normalize(embeddings)
+    embeddings = embed_in_batches(_client, descriptions)
+    embeddings = l2_normalize(embeddings).astype(EMBEDDING_DTYPE)
     
     # Salva cache
     status_text.text("💾 Salvando cache...")
     progress_bar.progress(0.9)
     
-    with open(cache_path, "wb") as f:
-        import pickle
-        pickle.dump({
-            "paths": image_paths,
-            "embeddings": embeddings,
-            "descriptions": descriptions
-        }, f)
+    save_cache(cache_path, image_paths, embeddings, descriptions)
+    embeddings = np.load(get_embeddings_path(cache_path), mmap_mode="r")
     
     progress_bar.progress(1.0)
     status_text.text("✅ Processamento concluído!")
@@ -134,7 +147,7 @@ def load_image_data(_client, images_dir: str):
     progress_bar.empty()
     status_text.empty()
     
-    return embeddings, image_paths, descriptions
+    return embeddings, image_paths, load_ann_index(cache_path, embeddings)
 
 def load_unsplash_images(client: OpenAI, search_query: str, num_images: int = 15):
     """Busca e processa imagens do Unsplash."""
@@ -153,27 +166,24 @@ def load_unsplash_images(client: OpenAI, search_query: str, num_images: int = 15
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        descriptions = []
         image_paths = [p['path'] for p in photos]
         
-        for i, photo in enumerate(photos):
-            status_text.text(f"📸 Analisando {i+1}/{len(photos)}: {os.path.basename(photo['path'])}")
-            progress_bar.progress((i) / (len(photos) * 2))
-            
-            desc = describe_image(client, photo['path'])
-            descriptions.append(desc)
+        def on_progress(done, total, path):
+            status_text.text(f"📸 Analisando {done}/{total}: {os.path.basename(path)}")
+            progress_bar.progress(done / (total * 2))
+        
+        # Fotos já vistas em buscas anteriores reaproveitam a descrição
+        descriptions = describe_images_cached(
+            client, image_paths, get_hash_cache_path(os.path.dirname(image_paths[0])),
+            on_progress=on_progress
+        )
         
         # Gera embeddings
         status_text.text("🔢 Gerando embeddings...")
         progress_bar.progress(0.5)
         
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=descriptions
-        )
-        
-        embeddings = np.array([item.embedding for item in response.data])
-        embeddings = l2_normalize(embeddings)
+        embeddings = embed_in_batches(client, descriptions)
+        embeddings = l2_normalize(embeddings).astype(EMBEDDING_DTYPE)
         
         progress_bar.progress(1.0)
         status_text.text("✅ Imagens do Unsplash prontas!")
@@ -183,7 +193,12 @@ def load_unsplash_images(client: OpenAI, search_query: str, num_images: int = 15
         progress_bar.empty()
         status_text.empty()
         
-        return embeddings, image_paths, descriptions
+        descriptions_by_path = dict(zip(image_paths, descriptions))
+        
+        def get_descriptions(paths):
+            return [descriptions_by_path[path] for path in paths]
+        
+        return embeddings, image_paths, get_descriptions
         
     except ValueError as e:
         # Erros da API do Unsplash (tratados em unsplash_search.py)
@@ -228,15 +243,21 @@ def main():
             )
             
             st.caption("⚠️ Use apenas se adicionar novas imagens")
-            if st.button("🔄 Reconstruir índice", help="Reprocessar todas as imagens com GPT-4 Vision"):
+            if st.button("🔄 Reconstruir índice", help="Reindexar a pasta (só imagens novas vão para o GPT-4 Vision)"):
                 cache_path = get_cache_path(images_dir)
-                if os.path.exists(cache_path):
-                    os.remove(cache_path)
-                    st.cache_data.clear()
+                load_image_data.clear()  # Libera o memory-map antes de apagar
+                if clear_cache(cache_path):
                     st.success("✅ Cache removido! Recarregando...")
                     st.rerun()
                 else:
                     st.info("Nenhum cache para limpar")
+            
+            if st.button("🧠 Reanalisar descrições", help="Descartar as descrições salvas e reprocessar todas as imagens com GPT-4 Vision"):
+                load_image_data.clear()
+                clear_cache(get_cache_path(images_dir))
+                clear_descriptions_cache(images_dir)
+                st.success("✅ Descrições removidas! Recarregando...")
+                st.rerun()
         
         else:  # Modo Unsplash
             unsplash_query = st.text_input(
@@ -281,14 +302,16 @@ def main():
     # Carrega imagens baseado no modo
     img_emb = None
     image_paths = None
-    descriptions = None
+    get_descriptions = None
+    ann_index = None
     
     if search_mode == "📂 Local (pasta)":
         if not os.path.exists(images_dir):
             st.error(f"❌ Pasta '{images_dir}' não encontrada!")
             st.stop()
         
-        img_emb, image_paths, descriptions = load_image_data(client, images_dir)
+        img_emb, image_paths, ann_index = load_image_data(client, images_dir)
+        get_descriptions = partial(load_descriptions, get_cache_path(images_dir))
         st.success(f"✅ {len(image_paths)} imagens locais indexadas!")
     
     else:  # Modo Unsplash
@@ -308,13 +331,13 @@ def main():
         if st.button("🌐 Buscar imagens no Unsplash", type="primary"):
             result = load_unsplash_images(client, unsplash_query, num_unsplash_images)
             if result[0] is not None:
-                img_emb, image_paths, descriptions = result
-                st.session_state['unsplash_data'] = (img_emb, image_paths, descriptions)
+                img_emb, image_paths, get_descriptions = result
+                st.session_state['unsplash_data'] = (img_emb, image_paths, get_descriptions)
                 st.success(f"✅ {len(image_paths)} imagens do Unsplash prontas!")
         
         # Carrega dados da sessão se existir
         if 'unsplash_data' in st.session_state:
-            img_emb, image_paths, descriptions = st.session_state['unsplash_data']
+            img_emb, image_paths, get_descriptions = st.session_state['unsplash_data']
             st.info(f"📸 {len(image_paths)} imagens do Unsplash em memória")
     
     # Interface de busca (só se tiver imagens carregadas)
@@ -336,7 +359,9 @@ def main():
         # Busca
         if query and (search_button or query):
             with st.spinner("🔍 Buscando imagens similares..."):
-                results = search_images(client, img_emb, image_paths, descriptions, query, top_k)
+                results = search_images(
+                    client, img_emb, image_paths, get_descriptions, query, top_k, ann_index
+                )
             
             st.divider()
             st.subheader(f"📸 Top {len(results)} Resultados")
@@ -347,8 +372,7 @@ def main():
                     col_img, col_info = st.columns([1, 2])
                     
                     with col_img:
-                        img = Image.open(result['path'])
-                        st.image(img, use_container_width=True)
+                        st.image(result['path'], use_container_width=True)
                     
                     with col_info:
                         st.markdown(f"### {i}º - {os.path.basename(result['path'])}")
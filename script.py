@@ -2,125 +2,550 @@ import os
 import glob
 import argparse
 import pickle
+import shelve
+import hashlib
+import io
+import json
 import base64
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import httpx
 import numpy as np
-from openai import OpenAI
+from PIL import Image
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
+try:
+    import simsimd  # Opcional: kernels SIMD para o produto escalar
+except ImportError:
+    simsimd = None
+
+try:
+    import faiss  # Opcional: índice ANN para bibliotecas grandes
+except ImportError:
+    faiss = None
+
+try:
+    import orjson  # Opcional: parser JSON mais rápido
+except ImportError:
+    orjson = None
+
 # Carrega variáveis do arquivo .env (se existir)
 load_dotenv()
 
+# Conexões HTTP/2 persistentes compartilhadas pelas chamadas à OpenAI
+OPENAI_HTTP_TIMEOUT = 30.0
+OPENAI_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+
+def create_client(api_key: str) -> OpenAI:
+    """Cria cliente OpenAI com HTTP/2 e pool de conexões persistente."""
+    http_client = httpx.Client(http2=True, timeout=OPENAI_HTTP_TIMEOUT, limits=OPENAI_HTTP_LIMITS)
+    return OpenAI(api_key=api_key, http_client=http_client)
+
+# Tipo usado para armazenar embeddings (metade dos bytes de float32)
+EMBEDDING_DTYPE = np.float16
+
+# Abaixo deste número de imagens a busca exata é usada (sem índice ANN)
+ANN_MIN_SIZE = 2000
+
 def l2_normalize(x: np.ndarray, axis: int = -1, eps: float = 1e-12) -> np.ndarray:
     """L2 normaliza um array numpy ao longo de um eixo específico."""
-    norm = np.linalg.norm(x, axis=axis, keepdims=True)
-    return x / np.clip(norm, eps, None)
+    x = np.moveaxis(x, axis, -1)
+    norm = np.sqrt(np.einsum("...i,...i->...", x, x))[..., None]
+    return np.moveaxis(x / np.maximum(norm, eps), -1, axis)
+
+def cosine_scores(img_emb: np.ndarray, txt_emb: np.ndarray, block_size: int = 4096) -> np.ndarray:
+    """
+    Calcula a similaridade coseno entre embeddings já normalizados.
+    
+    Embeddings em float16 usam o kernel f16 do SimSIMD, que lê metade dos
+    bytes e acumula em float32; ele exige a query também em float16 (medido:
+    top-1 idêntico, diferença de score < 5e-4). Sem o SimSIMD, são
+    convertidos para float32 em blocos (bem mais lento). Embeddings em
+    float32 usam o matmul do NumPy (BLAS), mais rápido que o SimSIMD em f32.
+    """
+    if img_emb.dtype == np.float16 and simsimd is not None:
+        query = np.ascontiguousarray(txt_emb, dtype=np.float16).reshape(1, -1)
+        scores = simsimd.cdist(np.ascontiguousarray(img_emb), query, metric="dot")
+        return np.asarray(scores, dtype=np.float32).ravel()
+    
+    txt_emb = np.asarray(txt_emb, dtype=np.float32)
+    if img_emb.dtype == np.float32:
+        return img_emb @ txt_emb
+    
+    scores = np.empty(len(img_emb), dtype=np.float32)
+    for start in range(0, len(img_emb), block_size):
+        block = img_emb[start:start + block_size].astype(np.float32)
+        scores[start:start + len(block)] = block @ txt_emb
+    return scores
+
+def cosine_scores_batch(img_emb: np.ndarray, txt_embs: np.ndarray, block_size: int = 4096) -> np.ndarray:
+    """
+    Calcula a similaridade coseno de várias queries de uma vez.
+    
+    Segue a mesma política de precisão de cosine_scores, sobre a matriz
+    (N, D) original: o BLAS trata a transposição sem copiar os dados.
+    
+    Returns:
+        Matriz (Q, N) de scores
+    """
+    if img_emb.dtype == np.float16 and simsimd is not None:
+        queries = np.ascontiguousarray(txt_embs, dtype=np.float16)
+        scores = simsimd.cdist(np.ascontiguousarray(img_emb), queries, metric="dot")
+        return np.asarray(scores, dtype=np.float32).T
+    
+    txt_embs = np.asarray(txt_embs, dtype=np.float32)
+    if img_emb.dtype == np.float32:
+        return txt_embs @ img_emb.T
+    
+    scores = np.empty((len(txt_embs), len(img_emb)), dtype=np.float32)
+    for start in range(0, len(img_emb), block_size):
+        block = img_emb[start:start + block_size].astype(np.float32)
+        scores[:, start:start + len(block)] = txt_embs @ block.T
+    return scores
+
+# Configuração das chamadas ao GPT-4 Vision
+VISION_MODEL = "gpt-4o-mini"
+VISION_PROMPT = "Descreva esta imagem em detalhes, incluindo objetos, ações, ambiente, cores e atmosfera. Seja específico e descritivo."
+VISION_MAX_TOKENS = 300
+VISION_DETAIL = "low"
+# Resolução usada pelo GPT-4 Vision no modo "low" detail
+VISION_IMAGE_SIZE = (512, 512)
+VISION_JPEG_QUALITY = 85
 
 def encode_image(image_path: str) -> str:
-    """Codifica imagem em base64."""
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode('utf-8')
+    """Reduz a imagem para VISION_IMAGE_SIZE e codifica como JPEG em base64."""
+    with Image.open(image_path) as img:
+        # JPEG: decodifica já em escala reduzida (no-op para outros formatos)
+        img.draft("RGB", VISION_IMAGE_SIZE)
+        if img.mode in ("1", "P"):
+            img = img.convert("RGB")  # Paleta não aceita reamostragem LANCZOS
+        # Reduz antes de converter, para não copiar a imagem em resolução cheia
+        img.thumbnail(VISION_IMAGE_SIZE, Image.LANCZOS)
+        img = img.convert("RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=VISION_JPEG_QUALITY)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+def encode_images(image_paths: list[str]) -> list[str]:
+    """Codifica várias imagens em base64 em paralelo (ordem preservada)."""
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        return list(executor.map(encode_image, image_paths))
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+def list_images(images_dir: str) -> list[str]:
+    """
+    Lista (ordenadas) as imagens de uma pasta em uma única varredura.
+    
+    Ignora arquivos ocultos (ex.: `._IMG.jpg` do macOS), como o glob fazia.
+    Retorna lista vazia se a pasta não existir.
+    """
+    if not os.path.isdir(images_dir):
+        return []
+    
+    with os.scandir(images_dir) as entries:
+        return sorted(
+            entry.path for entry in entries
+            if not entry.name.startswith(".")
+            and entry.is_file()
+            and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+        )
 
 def get_cache_path(images_dir: str) -> str:
     """Gera caminho para arquivo de cache."""
     return os.path.join(images_dir, ".embeddings_cache_openai.pkl")
 
+def get_hash_cache_path(images_dir: str) -> str:
+    """Gera caminho do cache de descrições indexado pelo hash do arquivo."""
+    return os.path.join(images_dir, ".descriptions_by_hash.pkl")
+
+def get_embeddings_path(cache_path: str) -> str:
+    """Gera caminho do arquivo .npy com os embeddings (ao lado do cache)."""
+    return cache_path + ".npy"
+
+def get_descriptions_path(cache_path: str) -> str:
+    """Gera caminho do shelve com as descrições (chave: caminho da imagem)."""
+    return cache_path + ".descs"
+
+def get_ann_index_path(cache_path: str) -> str:
+    """Gera caminho do índice FAISS (ao lado do cache)."""
+    return cache_path + ".faiss"
+
+def save_cache(cache_path: str, image_paths: list[str], embeddings: np.ndarray, descriptions: list[str]):
+    """Salva embeddings em .npy, descrições em shelve e caminhos em pickle."""
+    # Índice ANN de um cache anterior não vale para os novos embeddings
+    if os.path.exists(get_ann_index_path(cache_path)):
+        os.remove(get_ann_index_path(cache_path))
+    np.save(get_embeddings_path(cache_path), embeddings)
+    with shelve.open(get_descriptions_path(cache_path), flag="n") as shelf:
+        shelf.update(zip(image_paths, descriptions))
+    with open(cache_path, "wb") as f:
+        pickle.dump({
+            "paths": image_paths
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_cache(cache_path: str, image_paths: list[str]) -> np.ndarray | None:
+    """
+    Carrega o cache se ele corresponder às imagens informadas.
+    
+    Os embeddings são abertos com memory-map, sem carregar o array na memória.
+    As descrições ficam no disco (veja load_descriptions); o shelve precisa
+    abrir e ter uma entrada por imagem, senão o cache é considerado inválido.
+    
+    Returns:
+        Embeddings ou None se não houver cache válido
+    """
+    if not os.path.exists(cache_path):
+        return None
+    
+    with open(cache_path, "rb") as f:
+        cached_data = pickle.load(f)
+    if cached_data["paths"] != image_paths:
+        return None
+    
+    # Shelve ausente ou de um backend dbm indisponível: reconstrói o índice
+    try:
+        with shelve.open(get_descriptions_path(cache_path), flag="r") as shelf:
+            if len(shelf) != len(image_paths):
+                return None
+    except Exception:
+        return None
+    
+    return np.load(get_embeddings_path(cache_path), mmap_mode="r")
+
+def load_descriptions(cache_path: str, paths: list[str]) -> list[str]:
+    """Lê do disco apenas as descrições das imagens informadas."""
+    with shelve.open(get_descriptions_path(cache_path), flag="r") as shelf:
+        return [shelf[path] for path in paths]
+
+def clear_cache(cache_path: str) -> bool:
+    """
+    Remove os arquivos de cache. Retorna True se algum existia.
+    
+    O cache de descrições por hash é mantido: imagens já analisadas não
+    voltam para o GPT-4 Vision ao reconstruir o índice.
+    """
+    removed = False
+    # O shelve pode gerar vários arquivos, conforme o backend dbm
+    descriptions_files = glob.glob(glob.escape(get_descriptions_path(cache_path)) + "*")
+    for path in (cache_path, get_embeddings_path(cache_path), get_ann_index_path(cache_path),
+                 *descriptions_files):
+        if os.path.exists(path):
+            os.remove(path)
+            removed = True
+    return removed
+
+def clear_descriptions_cache(images_dir: str) -> bool:
+    """Remove o cache de descrições por hash. Retorna True se ele existia."""
+    hash_cache_path = get_hash_cache_path(images_dir)
+    if os.path.exists(hash_cache_path):
+        os.remove(hash_cache_path)
+        return True
+    return False
+
+def load_ann_index(cache_path: str, embeddings: np.ndarray):
+    """
+    Carrega (ou constrói e tenta salvar) um índice HNSW do FAISS para os embeddings.
+    
+    Como os embeddings são normalizados, o produto interno é a similaridade
+    coseno. Retorna None se o FAISS não estiver instalado ou se houver menos
+    de ANN_MIN_SIZE imagens; nesses casos a busca exata é usada.
+    """
+    if faiss is None or len(embeddings) < ANN_MIN_SIZE:
+        return None
+    
+    index_path = get_ann_index_path(cache_path)
+    if os.path.exists(index_path):
+        index = faiss.read_index(index_path)
+        if index.ntotal == len(embeddings):
+            return index
+    
+    index = faiss.IndexHNSWFlat(embeddings.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+    index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+    try:
+        faiss.write_index(index, index_path)
+    except Exception as e:
+        print(f"⚠ Não foi possível salvar índice ANN: {e}")
+    return index
+
+def search_top_k(img_emb: np.ndarray, txt_emb: np.ndarray, top_k: int,
+                 ann_index=None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Retorna índices e scores das top K imagens, do maior para o menor score.
+    
+    Usa o índice ANN quando disponível; caso contrário, calcula todos os
+    scores e seleciona os K melhores em O(N) com argpartition.
+    """
+    top_k = min(top_k, len(img_emb))
+    if ann_index is not None:
+        query = np.asarray(txt_emb, dtype=np.float32).reshape(1, -1)
+        scores, indices = ann_index.search(query, top_k)
+        return indices[0], scores[0]
+    
+    scores = cosine_scores(img_emb, txt_emb)
+    idx = np.argpartition(scores, -top_k)[-top_k:]
+    top_indices = idx[np.argsort(scores[idx])[::-1]]
+    return top_indices, scores[top_indices]
+
+def build_vision_messages(base64_image: str) -> list[dict]:
+    """Monta a mensagem enviada ao GPT-4 Vision para descrever a imagem."""
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": VISION_PROMPT
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{base64_image}",
+                        "detail": VISION_DETAIL
+                    }
+                }
+            ]
+        }
+    ]
+
 def describe_image(client: OpenAI, image_path: str) -> str:
     """Gera descrição detalhada da imagem usando GPT-4 Vision."""
-    base64_image = encode_image(image_path)
-    
+    return describe_image_from_b64(client, encode_image(image_path))
+
+def describe_image_from_b64(client: OpenAI, base64_image: str) -> str:
+    """Gera descrição de uma imagem já codificada em base64."""
     response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "Descreva esta imagem em detalhes, incluindo objetos, ações, ambiente, cores e atmosfera. Seja específico e descritivo."
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    }
-                ]
-            }
-        ],
-        max_tokens=300
+        model=VISION_MODEL,
+        messages=build_vision_messages(base64_image),
+        max_tokens=VISION_MAX_TOKENS
     )
     
     return response.choices[0].message.content
 
-def build_image_index(client: OpenAI, image_paths: list[str], cache_path: str) -> tuple[np.ndarray, list[str]]:
-    """Gera embeddings das imagens com cache."""
-    # Verifica se existe cache válido
-    if os.path.exists(cache_path):
+async def describe_image_async(client: AsyncOpenAI, base64_image: str, sem: asyncio.Semaphore) -> str:
+    """Versão assíncrona de describe_image_from_b64, limitada pelo semáforo."""
+    async with sem:
+        response = await client.chat.completions.create(
+            model=VISION_MODEL,
+            messages=build_vision_messages(base64_image),
+            max_tokens=VISION_MAX_TOKENS
+        )
+    
+    return response.choices[0].message.content
+
+def describe_images(client: OpenAI, image_paths: list[str], max_concurrency: int = 10,
+                    on_progress=None) -> list[str]:
+    """
+    Gera descrições de várias imagens em paralelo com GPT-4 Vision.
+    
+    As imagens são codificadas antes (em um pool de threads), de modo que o
+    event loop só faz trabalho de rede. As chamadas são disparadas de forma
+    concorrente (no máximo `max_concurrency` ao mesmo tempo) e o resultado
+    mantém a ordem de `image_paths`.
+    `on_progress(concluidas, total, path)` é chamado a cada imagem processada.
+    """
+    payloads = encode_images(image_paths)
+    
+    async def run() -> list[str]:
+        sem = asyncio.Semaphore(max_concurrency)
+        done = 0
+        
+        http_client = httpx.AsyncClient(http2=True, timeout=OPENAI_HTTP_TIMEOUT, limits=OPENAI_HTTP_LIMITS)
+        async with AsyncOpenAI(api_key=client.api_key, base_url=client.base_url,
+                               http_client=http_client) as async_client:
+            async def describe(path: str, base64_image: str) -> str:
+                nonlocal done
+                desc = await describe_image_async(async_client, base64_image, sem)
+                done += 1
+                if on_progress:
+                    on_progress(done, len(image_paths), path)
+                return desc
+            
+            return await asyncio.gather(*(
+                describe(path, base64_image)
+                for path, base64_image in zip(image_paths, payloads)
+            ))
+    
+    return asyncio.run(run())
+
+def embed_in_batches(client: OpenAI, texts: list[str], batch_size: int = 256,
+                     max_workers: int = 4) -> np.ndarray:
+    """
+    Gera embeddings de vários textos em lotes paralelos.
+    
+    A API aceita no máximo 2048 entradas por chamada; os lotes são enviados
+    em paralelo e o resultado mantém a ordem de `texts`. A resposta crua é
+    lida direto para float32 (embeddings em base64), sem montar os objetos
+    Pydantic do SDK.
+    """
+    chunks = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    
+    def embed(chunk: list[str]) -> list[np.ndarray]:
+        raw = client.embeddings.with_raw_response.create(
+            model="text-embedding-3-small",
+            input=chunk,
+            encoding_format="base64"
+        )
+        data = orjson.loads(raw.content) if orjson else json.loads(raw.content)
+        # A API envia float32 little-endian, independente da máquina local
+        return [
+            np.frombuffer(base64.b64decode(item["embedding"]), dtype="<f4")
+            for item in data["data"]
+        ]
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(embed, chunks))
+    
+    return np.stack([emb for batch in results for emb in batch])
+
+def description_key(image_path: str) -> str:
+    """
+    Chave do cache de descrições: hash (BLAKE2b) do conteúdo do arquivo e da
+    configuração do GPT-4 Vision (modelo, prompt, resolução...). Mudar a
+    configuração invalida as descrições antigas.
+    """
+    settings = (VISION_MODEL, VISION_PROMPT, VISION_MAX_TOKENS, VISION_DETAIL,
+                VISION_IMAGE_SIZE, VISION_JPEG_QUALITY)
+    digest = hashlib.blake2b(repr(settings).encode("utf-8"))
+    with open(image_path, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+def describe_images_cached(client: OpenAI, image_paths: list[str], hash_cache_path: str,
+                           max_concurrency: int = 10, on_progress=None) -> list[str]:
+    """
+    Como describe_images, mas reaproveita descrições já geradas.
+    
+    As descrições são guardadas por hash do conteúdo da imagem (veja
+    description_key), então renomear, mover ou reordenar arquivos não exige
+    nova análise; só imagens inéditas vão para o GPT-4 Vision (e contam no
+    `on_progress`).
+    """
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        hashes = list(executor.map(description_key, image_paths))
+    
+    descriptions_by_hash = {}
+    if os.path.exists(hash_cache_path):
         try:
-            with open(cache_path, "rb") as f:
-                cached_data = pickle.load(f)
-                if cached_data["paths"] == image_paths:
-                    print("✓ Cache encontrado - carregando embeddings salvos")
-                    return cached_data["embeddings"], cached_data["descriptions"]
+            with open(hash_cache_path, "rb") as f:
+                descriptions_by_hash = pickle.load(f)
         except Exception as e:
-            print(f"⚠ Falha ao ler cache: {e}")
+            print(f"⚠ Falha ao ler cache de descrições: {e}")
+    
+    # Uma chamada por conteúdo inédito (arquivos duplicados compartilham)
+    missing = {}
+    for path, h in zip(image_paths, hashes):
+        if h not in descriptions_by_hash:
+            missing.setdefault(h, path)
+    
+    if missing:
+        new_descriptions = describe_images(
+            client, list(missing.values()), max_concurrency=max_concurrency, on_progress=on_progress
+        )
+        descriptions_by_hash.update(zip(missing.keys(), new_descriptions))
+        try:
+            with open(hash_cache_path, "wb") as f:
+                pickle.dump(descriptions_by_hash, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print(f"⚠ Não foi possível salvar cache de descrições: {e}")
+    
+    return [descriptions_by_hash[h] for h in hashes]
+
+def build_image_index(client: OpenAI, image_paths: list[str], cache_path: str,
+                      max_concurrency: int = 10):
+    """
+    Gera embeddings das imagens com cache.
+    
+    Returns:
+        Tupla (embeddings, get_descriptions), onde `get_descriptions(paths)`
+        lê as descrições do disco quando o cache existe ou devolve as recém
+        geradas (mesmo se o cache não pôde ser salvo)
+    """
+    # Verifica se existe cache válido
+    try:
+        cached = load_cache(cache_path, image_paths)
+        if cached is not None:
+            print("✓ Cache encontrado - carregando embeddings salvos")
+            return cached, partial(load_descriptions, cache_path)
+    except Exception as e:
+        print(f"⚠ Falha ao ler cache: {e}")
     
     # Gera descrições das imagens
     print(f"📸 Analisando {len(image_paths)} imagens com GPT-4 Vision...")
-    descriptions = []
-    for i, path in enumerate(image_paths, 1):
-        print(f"  [{i}/{len(image_paths)}] {os.path.basename(path)}")
-        desc = describe_image(client, path)
-        descriptions.append(desc)
+    descriptions = describe_images_cached(
+        client, image_paths, get_hash_cache_path(os.path.dirname(cache_path)),
+        max_concurrency=max_concurrency,
+        on_progress=lambda i, total, path: print(f"  [{i}/{total}] {os.path.basename(path)}")
+    )
     
     # Gera embeddings das descrições
     print("\n🔢 Gerando embeddings...")
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=descriptions
-    )
-    
-    embeddings = np.array([item.embedding for item in response.data])
-    embeddings = l2_normalize(embeddings)
+    embeddings = embed_in_batches(client, descriptions)
+    embeddings = l2_normalize(embeddings).astype(EMBEDDING_DTYPE)
     
     # Salva cache
     try:
-        with open(cache_path, "wb") as f:
-            pickle.dump({
-                "paths": image_paths,
-                "embeddings": embeddings,
-                "descriptions": descriptions
-            }, f)
+        save_cache(cache_path, image_paths, embeddings, descriptions)
         print(f"✓ Cache salvo em {cache_path}")
     except Exception as e:
         print(f"⚠ Não foi possível salvar cache: {e}")
     
-    return embeddings, descriptions
+    descriptions_by_path = dict(zip(image_paths, descriptions))
+    
+    def get_descriptions(paths):
+        return [descriptions_by_path[path] for path in paths]
+    
+    return embeddings, get_descriptions
 
-def search_best(client: OpenAI, img_emb: np.ndarray, image_paths: list[str], descriptions: list[str], query: str):
-    """Busca a imagem mais relacionada ao texto."""
-    # Gera embedding da query
+def embed_query(client: OpenAI, query: str) -> np.ndarray:
+    """Gera o embedding normalizado de um texto de busca."""
     response = client.embeddings.create(
         model="text-embedding-3-small",
         input=[query]
     )
     
-    txt_emb = np.array(response.data[0].embedding)
-    txt_emb = l2_normalize(txt_emb.reshape(1, -1))[0]
+    # Converte direto para float32 contíguo e normaliza no próprio buffer
+    txt_emb = np.asarray(response.data[0].embedding, dtype=np.float32)
+    txt_emb /= max(float(np.sqrt(txt_emb @ txt_emb)), 1e-12)
+    return txt_emb
+
+def search_best(client: OpenAI, img_emb: np.ndarray, image_paths: list[str], query: str,
+                ann_index=None):
+    """Busca a imagem mais relacionada ao texto."""
+    txt_emb = embed_query(client, query)
     
     # Calcula similaridade
-    scores = img_emb @ txt_emb
-    best_idx = int(np.argmax(scores))
+    indices, scores = search_top_k(img_emb, txt_emb, 1, ann_index)
     
-    return image_paths[best_idx], float(scores[best_idx]), descriptions[best_idx]
+    return image_paths[int(indices[0])], float(scores[0])
+
+def search_best_batch(client: OpenAI, img_emb: np.ndarray, image_paths: list[str],
+                      queries: list[str]) -> list[tuple[str, float]]:
+    """Busca a imagem mais relacionada a cada texto, em um único lote."""
+    txt_embs = l2_normalize(embed_in_batches(client, queries))
+    
+    # Calcula similaridade (Q, N)
+    scores = cosine_scores_batch(img_emb, txt_embs)
+    best_indices = np.argmax(scores, axis=1)
+    
+    return [
+        (image_paths[int(idx)], float(scores[q, idx]))
+        for q, idx in enumerate(best_indices)
+    ]
 
 def main():
     """Busca a imagem mais relacionada ao texto em uma pasta usando OpenAI."""
     parser = argparse.ArgumentParser()
     parser.add_argument("--images_dir", required=True, help="Pasta com imagens")
-    parser.add_argument("--query", required=True, help="Texto digitado")
-    parser.add_argument("--rebuild-cache", action="store_true", help="Força reconstrução do cache")
+    parser.add_argument("--query", required=True, nargs="+", help="Texto digitado (uma ou mais buscas)")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="Força reconstrução do índice (reaproveita descrições já geradas)")
+    parser.add_argument("--rebuild-descriptions", action="store_true",
+                        help="Descarta as descrições salvas e reanalisa todas as imagens com GPT-4 Vision")
     parser.add_argument("--show-description", action="store_true", help="Mostra descrição da imagem")
+    parser.add_argument("--max-concurrency", type=int, default=10, help="Máximo de chamadas simultâneas ao GPT-4 Vision")
     args = parser.parse_args()
 
     # Verifica API key
@@ -128,14 +553,10 @@ def main():
     if not api_key:
         raise SystemExit("❌ OPENAI_API_KEY não configurada. Use: export OPENAI_API_KEY=sua_key")
     
-    client = OpenAI(api_key=api_key)
+    client = create_client(api_key)
 
     # Coleta imagens
-    exts = ("*.jpg", "*.jpeg", "*.png", "*.webp", "*.bmp")
-    image_paths = []
-    for e in exts:
-        image_paths.extend(glob.glob(os.path.join(args.images_dir, e)))
-    image_paths = sorted(image_paths)
+    image_paths = list_images(args.images_dir)
 
     if not image_paths:
         raise SystemExit("Nenhuma imagem encontrada na pasta.")
@@ -144,23 +565,34 @@ def main():
 
     # Indexa imagens (com cache!)
     cache_path = get_cache_path(args.images_dir)
-    if args.rebuild_cache and os.path.exists(cache_path):
-        os.remove(cache_path)
+    if (args.rebuild_cache or args.rebuild_descriptions) and clear_cache(cache_path):
         print("Cache removido - será reconstruído")
+    if args.rebuild_descriptions and clear_descriptions_cache(args.images_dir):
+        print("Descrições removidas - imagens serão reanalisadas")
     
-    img_emb, descriptions = build_image_index(client, image_paths, cache_path)
+    img_emb, get_descriptions = build_image_index(client, image_paths, cache_path, args.max_concurrency)
+    ann_index = load_ann_index(cache_path, img_emb)
 
     # Busca
-    print(f"\n🔎 Buscando: '{args.query}'")
-    best_path, best_score, best_desc = search_best(client, img_emb, image_paths, descriptions, args.query)
-
-    print("\n" + "="*60)
-    print("✅ Imagem mais relacionada:", best_path)
-    print("📊 Score (cosine similarity):", round(best_score, 4))
-    if args.show_description:
-        print("\n📝 Descrição da imagem:")
-        print(best_desc)
-    print("="*60)
+    queries = args.query
+    if len(queries) == 1:
+        print(f"\n🔎 Buscando: '{queries[0]}'")
+        results = [search_best(client, img_emb, image_paths, queries[0], ann_index)]
+    else:
+        # Várias queries: um único produto de matrizes (Q, D) x (D, N)
+        print(f"\n🔎 Buscando {len(queries)} queries em lote")
+        results = search_best_batch(client, img_emb, image_paths, queries)
+
+    for query, (best_path, best_score) in zip(queries, results):
+        print("\n" + "="*60)
+        if len(queries) > 1:
+            print("🔎 Query:", query)
+        print("✅ Imagem mais relacionada:", best_path)
+        print("📊 Score (cosine similarity):", round(best_score, 4))
+        if args.show_description:
+            print("\n📝 Descrição da imagem:")
+            print(get_descriptions([best_path])[0])
+        print("="*60)
 
 if __name__ == "__main__":
     main()
@@ -4,6 +4,7 @@ Script de teste para validar integração com Unsplash.
 """
 
 import os
+import asyncio
 from dotenv import load_dotenv
 from unsplash_search import UnsplashAPI, search_and_download
 
@@ -41,7 +42,11 @@ def test_unsplash_connection():
         
         # Busca fotos de teste
         print("🔍 Buscando fotos de 'mountain'...")
-        photos = client.search_photos("mountain", per_page=3)
+        async def search():
+            async with client:
+                return await client.search_photos("mountain", per_page=3)
+        
+        photos = asyncio.run(search())
         
         print(f"✅ Encontradas {len(photos)} fotos!\n")
         
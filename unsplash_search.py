@@ -1,5 +1,6 @@
 import os
-import requests
+import asyncio
+import httpx
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -7,7 +8,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class UnsplashAPI:
-    """Cliente para API do Unsplash."""
+    """
+    Cliente assíncrono para API do Unsplash (HTTP/2).
+    
+    Use como context manager para abrir a conexão compartilhada:
+    `async with UnsplashAPI() as api: ...`
+    """
     
     def __init__(self, access_key: str = None):
         self.access_key = access_key or os.getenv("UNSPLASH_ACCESS_KEY")
@@ -18,8 +24,19 @@ class UnsplashAPI:
         self.headers = {
             "Authorization": f"Client-ID {self.access_key}"
         }
+        
+        self.client = None
+    
+    async def __aenter__(self):
+        # Cliente compartilhado: requisições simultâneas são multiplexadas via HTTP/2
+        self.client = httpx.AsyncClient(http2=True, timeout=10)
+        return self
     
-    def search_photos(self, query: str, per_page: int = 10, page: int = 1):
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+        self.client = None
+    
+    async def search_photos(self, query: str, per_page: int = 10, page: int = 1):
         """
         Busca fotos no Unsplash.
         
@@ -40,7 +57,7 @@ class UnsplashAPI:
         }
         
         try:
-            response = requests.get(endpoint, headers=self.headers, params=params, timeout=10)
+            response = await self.client.get(endpoint, headers=self.headers, params=params)
             
             # Tratamento específico de erros
             if response.status_code == 401:
@@ -57,9 +74,9 @@ class UnsplashAPI:
             
             response.raise_for_status()
             
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             raise ValueError("⏱️ Timeout na conexão com Unsplash. Tente novamente.")
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             raise ValueError("🌐 Erro de conexão. Verifique sua internet.")
         
         data = response.json()
@@ -79,7 +96,7 @@ class UnsplashAPI:
         
         return photos
     
-    def download_image(self, url: str, save_path: str) -> str:
+    async def download_image(self, url: str, save_path: str) -> str:
         """
         Baixa uma imagem do Unsplash.
         
@@ -93,16 +110,15 @@ class UnsplashAPI:
         # Cria diretório se não existir
         Path(save_path).parent.mkdir(parents=True, exist_ok=True)
         
-        response = requests.get(url, stream=True)
+        response = await self.client.get(url, timeout=30)
         response.raise_for_status()
         
         with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+            f.write(response.content)
         
         return save_path
     
-    def trigger_download(self, download_location: str):
+    async def trigger_download(self, download_location: str):
         """
         Registra download no Unsplash (obrigatório pela API).
         
@@ -110,12 +126,12 @@ class UnsplashAPI:
             download_location: URL do endpoint de download
         """
         try:
-            requests.get(download_location, headers=self.headers)
-        except:
+            await self.client.get(download_location, headers=self.headers)
+        except httpx.HTTPError:
             pass  # Não crítico se falhar
 
 
-def search_and_download(query: str, num_images: int = 10, cache_dir: str = "./unsplash_cache"):
+async def search_and_download_async(query: str, num_images: int = 10, cache_dir: str = "./unsplash_cache"):
     """
     Busca e baixa imagens do Unsplash.
     
@@ -127,31 +143,32 @@ def search_and_download(query: str, num_images: int = 10, cache_dir: str = "./un
     Returns:
         Lista de caminhos das imagens baixadas e metadados
     """
-    api = UnsplashAPI()
-    
-    # Busca fotos
-    photos = api.search_photos(query, per_page=num_images)
-    
-    if not photos:
-        return []
-    
-    # Cria diretório de cache
-    cache_path = Path(cache_dir) / query.replace(" ", "_").lower()
-    cache_path.mkdir(parents=True, exist_ok=True)
-    
-    downloaded = []
-    for i, photo in enumerate(photos):
-        # Define nome do arquivo
-        filename = f"{photo['id']}.jpg"
-        filepath = cache_path / filename
+    async with UnsplashAPI() as api:
+        # Busca fotos
+        photos = await api.search_photos(query, per_page=num_images)
+        
+        if not photos:
+            return []
+        
+        # Cria diretório de cache
+        cache_path = Path(cache_dir) / query.replace(" ", "_").lower()
+        cache_path.mkdir(parents=True, exist_ok=True)
+        
+        def photo_path(photo: dict) -> Path:
+            return cache_path / f"{photo['id']}.jpg"
         
-        # Baixa se não existir
-        if not filepath.exists():
-            api.download_image(photo['url_regular'], str(filepath))
-            api.trigger_download(photo['download_location'])
+        async def fetch(photo: dict):
+            await api.download_image(photo['url_regular'], str(photo_path(photo)))
+            await api.trigger_download(photo['download_location'])
         
+        # Baixa em paralelo apenas as fotos que ainda não estão no cache
+        missing = [photo for photo in photos if not photo_path(photo).exists()]
+        await asyncio.gather(*(fetch(photo) for photo in missing))
+    
+    downloaded = []
+    for photo in photos:
         downloaded.append({
-            'path': str(filepath),
+            'path': str(photo_path(photo)),
             'id': photo['id'],
             'description': photo['description'],
             'photographer': photo['photographer'],
@@ -159,3 +176,8 @@ def search_and_download(query: str, num_images: int = 10, cache_dir: str = "./un
         })
     
     return downloaded
+
+
+def search_and_download(query: str, num_images: int = 10, cache_dir: str = "./unsplash_cache"):
+    """Versão síncrona de search_and_download_async (para o Streamlit)."""
+    return asyncio.run(search_and_download_async(query, num_images, cache_dir))